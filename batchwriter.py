@@ -0,0 +1,73 @@
+"""Append-only, batched CSV writing for crawlers that produce rows one at a time"""
+import csv
+import os
+
+class BatchWriter:
+    """Writes dict rows to a CSV file in batches, so crawlers never have to
+    hold more than batchsize rows in memory.
+
+    Rows are written to path + '.part' while the writer is open. Each full batch
+    is flushed to disk, so an interrupted crawl leaves its partial results in
+    the .part file. When the writer is closed without an error the .part file
+    is renamed to path.
+
+    The .part file is only for inspecting a failed run. It can't be resumed: a
+    new writer for the same path starts it over. Crawlers that need to pick up
+    where they left off do so from their own per-page files (the NCAA team
+    files and ESPN week files), which are written with their own BatchWriters
+    so that a page is only ever saved complete.
+
+    path - the final CSV file to write.
+    fieldnames - the columns of the CSV, in order. Keys of a row that are not
+        in fieldnames are ignored, and missing keys are written as ''.
+    batchsize - the number of rows to buffer before writing them out.
+    """
+    def __init__(self, path, fieldnames, batchsize=1000):
+        self.path = path
+        self.partpath = path + '.part'
+        self.batchsize = batchsize
+        self.rowcount = 0
+        self._batch = []
+        folder = os.path.split(path)[0]
+        if folder != '':
+            os.makedirs(folder, exist_ok=True)
+        self._file = open(self.partpath, 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames, restval='',
+                                      extrasaction='ignore')
+        self._writer.writeheader()
+
+    def writerow(self, row):
+        """Adds one row (a dict) to the current batch, writing the batch out
+        if it is full."""
+        self._batch.append(row)
+        if len(self._batch) >= self.batchsize:
+            self.flush()
+
+    def writerows(self, rows):
+        """Adds every row in the iterable rows. rows may be a generator."""
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        """Writes out the current batch and flushes it to disk."""
+        self._writer.writerows(self._batch)
+        self.rowcount += len(self._batch)
+        self._batch = []
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self, complete=True):
+        """Writes any remaining rows and closes the file. If complete, the
+        .part file is moved to its final path."""
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+        if complete:
+            os.replace(self.partpath, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(complete=(exc_type is None))
@@ -0,0 +1,160 @@
+"""Command line entry point for crawling, cleaning, rating and querying.
+
+Each subcommand imports the modules it needs only when it runs, so that quick
+commands like query don't pay for pandas, requests or selenium."""
+import argparse
+import importlib
+
+# Crawler modules by data source. Their filenames aren't valid identifiers,
+# so they're loaded with importlib.
+_SOURCES = {'jhowell':'data-jhowell', 'ncaa':'data-ncaa', 'espn':'data-espn'}
+
+def _crawl(args):
+    """Crawls the chosen source and saves its games as a CSV."""
+    source = importlib.import_module(_SOURCES[args.source])
+    if args.source == 'jhowell':
+        gamesfile = source.crawl(args.wait, args.folder or 'Data/jhowell')
+    elif args.source == 'ncaa':
+        gamesfile = source.crawl(args.folder or 'Data/NCAA')
+    else:
+        gamesfile = source.crawl(folder=args.folder or 'Data/ESPN')
+    print(gamesfile)
+
+def _clean(args):
+    """Turns Jim Howell's raw games into the games and teams CSVs."""
+    import pandas
+    jhowell = importlib.import_module(_SOURCES['jhowell'])
+    rawgames = pandas.read_csv(args.rawgames)
+    games,teams = jhowell.clean_raw(rawgames)
+    games.to_csv(args.games,index=False)
+    teams.to_csv(args.teams,index=False)
+
+def _read_games(args):
+    """Reads the games and teams CSVs named in args."""
+    import pandas
+    games = pandas.read_csv(args.games)
+    games = games[games['Season']>=args.since]
+    teams = pandas.read_csv(args.teams)
+    return games,teams
+
+def _rate(args):
+    """Rates all the games and saves every team's final Elo."""
+    import main
+    games,teams = _read_games(args)
+    try:
+        elos,loglik = main.rate(games, teams, k=args.k,
+                                major_elo=args.major_elo,
+                                nonmajor_elo=args.nonmajor_elo,
+                                regression=args.regression,
+                                homefield=args.homefield, solve=args.solve,
+                                verbose=args.verbose)
+    except ValueError as e:
+        raise SystemExit('cfbelo rate: {}'.format(e))
+    elos = elos.sort_values(ascending=False)
+    elos.to_csv(args.ratings,index_label='Team',header=True)
+    print('Log-likelihood: {}'.format(loglik))
+
+def _tune(args):
+    """Hill-climbs the rating parameters to maximize the log-likelihood of
+    the game results."""
+    import main
+    import schedule
+    import hillclimb
+    games,teams = _read_games(args)
+    # Build the weekly matrices once and reuse them for every evaluation
+    weekly = schedule.WeeklyIncidence(games, teams)
+    def loglik(k, nonmajor_elo, regression, homefield):
+        if k <= 0 or not (0 <= regression <= 1) or homefield < 0:
+            raise ValueError('Parameters out of range')
+        return main.run(weekly, k=k, major_elo=args.major_elo,
+                        nonmajor_elo=nonmajor_elo, regression=regression,
+                        homefield=homefield, solve=args.solve)[1]
+    start = (args.k, args.nonmajor_elo, args.regression, args.homefield)
+    best = hillclimb.climb_continuous(loglik, start,
+                                      initstepsize=(5, 100, 0.05, 5))
+    for name,value in zip(['k','nonmajor_elo','regression','homefield'],best):
+        print('{} = {}'.format(name,value))
+
+def _query(args):
+    """Prints teams' ratings from a saved ratings CSV. Uses only the csv module
+    so that it starts quickly."""
+    import csv
+    with open(args.ratings, newline='') as f:
+        rows = [(r['Team'],float(r['Elo'])) for r in csv.DictReader(f)]
+    rows.sort(key=lambda r: r[1], reverse=True)
+    ranked = [(rank,team,rating) for rank,(team,rating) in enumerate(rows,1)]
+    if args.teams:
+        wanted = set(args.teams)
+        ranked = [r for r in ranked if r[1] in wanted]
+    else:
+        ranked = ranked[:args.top]
+    for rank,team,rating in ranked:
+        print('{:>4} {:<30} {:.1f}'.format(rank,team,rating))
+
+def _add_rating_args(parser, homefield):
+    """Adds the arguments shared by the rate and tune subcommands. Defaults
+    are the same as in main.py, which isn't imported here to keep startup
+    fast, except for homefield: rate leaves home field out like main.run does
+    (0), while tune starts climbing from main.HOMEFIELD (25)."""
+    parser.add_argument('--games', default='Data/games.csv',
+                        help='CSV with Season, Week, Home, Away and Winner '
+                             'columns, as written by clean')
+    parser.add_argument('--teams', default='Data/teams.csv',
+                        help='CSV of major teams with Team and Season '
+                             'columns, as written by clean')
+    parser.add_argument('--since', type=int, default=1977,
+                        help='first season to rate')
+    parser.add_argument('--k', type=float, default=20)
+    parser.add_argument('--major-elo', type=float, default=1500)
+    parser.add_argument('--nonmajor-elo', type=float, default=1200)
+    parser.add_argument('--regression', type=float, default=0.333)
+    parser.add_argument('--homefield', type=float, default=homefield)
+    parser.add_argument('--solve', action='store_true',
+                        help='solve each week to consistency')
+
+def make_parser():
+    """Returns the argparse parser for the command line interface."""
+    parser = argparse.ArgumentParser(prog='cfbelo',
+                                     description='College football Elo ratings')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    # crawl
+    crawl = subparsers.add_parser('crawl', help='crawl a website for games')
+    crawl.add_argument('source', choices=sorted(_SOURCES))
+    crawl.add_argument('--folder', default=None,
+                       help='where to save pages and games')
+    crawl.add_argument('--wait', type=float, default=1,
+                       help='seconds to wait between pages (jhowell only)')
+    crawl.set_defaults(func=_crawl)
+    # clean
+    clean = subparsers.add_parser('clean', help='clean raw jhowell games')
+    clean.add_argument('--rawgames', default='Data/jhowell/rawgames.csv',
+                       help='raw games CSV, as written by crawl jhowell')
+    clean.add_argument('--games', default='Data/games.csv')
+    clean.add_argument('--teams', default='Data/teams.csv')
+    clean.set_defaults(func=_clean)
+    # rate
+    rate = subparsers.add_parser('rate', help='compute Elo ratings')
+    _add_rating_args(rate, homefield=0)
+    rate.add_argument('--ratings', default='Data/ratings.csv',
+                      help='where to save the final ratings')
+    rate.add_argument('--verbose', action='store_true')
+    rate.set_defaults(func=_rate)
+    # tune
+    tune = subparsers.add_parser('tune', help='optimize rating parameters')
+    _add_rating_args(tune, homefield=25)
+    tune.set_defaults(func=_tune)
+    # query
+    query = subparsers.add_parser('query', help='show saved ratings')
+    query.add_argument('teams', nargs='*', help='teams to show (default: top)')
+    query.add_argument('--ratings', default='Data/ratings.csv')
+    query.add_argument('--top', type=int, default=25)
+    query.set_defaults(func=_query)
+    return parser
+
+def run(argv=None):
+    """Parses argv (default: sys.argv) and runs the chosen subcommand."""
+    args = make_parser().parse_args(argv)
+    args.func(args)
+
+if __name__ == '__main__':
+    run()
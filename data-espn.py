@@ -6,9 +6,17 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import datetime
 import dateutil.parser as dateparser
 import bs4
-import pandas
 import contextlib
 import time
+import itertools
+import os
+import csv
+
+from batchwriter import BatchWriter
+
+# Columns of the combined games CSV
+_GAMES_COLUMNS = ['Date','Season','Home','Away','Winner','HomePts','AwayPts',
+                  'NeutralSite']
 
 # Like a different version of contextlib.closing
 @contextlib.contextmanager
@@ -19,7 +27,7 @@ def _quitting(thing):
         thing.quit()
 
 def _get_week_games(season,division,week,waittime):
-    """Returns a pandas dataframe of the games from the ESPN page for the given parameters.
+    """Yields a dict for each game on the ESPN page for the given parameters.
     
     season - a year number
     division - one of 'FBS','FCS', or 'D2/D3'
@@ -38,23 +46,17 @@ def _get_week_games(season,division,week,waittime):
     url = base_url.format(group=group_codes[division],year=season,
                           seasontype=seasontype,week=weeknum)
     # Get the games from that URL                      
-    games = None
     with _quitting(webdriver.PhantomJS()) as driver:
         driver.get(url)
         # Wait for a bit so that dynamic things can load
         if _wait_for_load(driver,waittime,1,10):
-            # Parse the page for game data
-            games = _scrub_week_page(driver)
-    # Clean up the data, add extra stuff, return it
-    if games is not None:
-        def fixdate(d):
-            newyear = season if d.month > 1 else (season + 1)
-            return datetime.date(newyear,d.month,d.day)
-        games['Date'] = games['Date'].map(fixdate)
-        games['Season'] = season
-    else:
-        games = pandas.DataFrame([])
-    return games
+            # Parse the page for game data, fix up the date and add the season
+            for game in _scrub_week_page(driver):
+                d = game['Date']
+                newyear = season if d.month > 1 else (season + 1)
+                game['Date'] = datetime.date(newyear,d.month,d.day)
+                game['Season'] = season
+                yield game
 
 def _wait_for_load(driver,waittime,poll,maxattempts):
     """Waits for the weekly games page to load and then returns a boolean value
@@ -85,12 +87,11 @@ def _wait_for_load(driver,waittime,poll,maxattempts):
     return True
 
 def _scrub_week_page(driver):
-    """Returns a pandas dataframe of all games shown on the given ESPN scoreboard
-    page. This is only being called if some games exist on the page."""
+    """Yields a dict for each game shown on the given ESPN scoreboard page.
+    This is only being called if some games exist on the page."""
     # Find the events div
     events_xpath = '//div[@id="events"]/*'
     current_date = None
-    games = []
     events_children = driver.find_elements_by_xpath(events_xpath)
     for child in events_children:
         if child.tag_name == 'h2':
@@ -100,8 +101,7 @@ def _scrub_week_page(driver):
             game = _parse_game(child)
             if game is not None:
                 game['Date'] = current_date
-                games.append(game)
-    return pandas.DataFrame(games)
+                yield game
         
 def _parse_game(table):
     """Returns a dictionary of game attributes after being passed an element
@@ -128,20 +128,22 @@ def _parse_game(table):
     elif data['AwayPts'] > data['HomePts']:
         data['Winner'] = data['Away']
     else:
-        data['Winnner'] = ''
+        data['Winner'] = ''
     # Neutral site
     data['NeutralSite'] = None #TODO
     return data
 
+def crawl(start=2011,stop=2012,folder='Data/ESPN',max_attempts=3,waittime=30):
+    """Crawls ESPN's scoreboard for every week of the seasons between start and
+    stop (inclusive), saving each week under folder/Weeks. Weeks that already
+    have a file are not crawled again. Returns the path of the combined games
+    CSV.
     
-if __name__ == '__main__':
-    import itertools
-    import os
-    
-    start = 2011
-    stop = 2012
-    basefolder = 'Data/ESPN/'
-    weekfolder = 'Data/ESPN/Weeks/'
+    max_attempts - number of times to try loading a week that has no games.
+    waittime - number of seconds to wait for each page to load
+    """
+    weekfolder = os.path.join(folder,'Weeks')
+    allgames_file = os.path.join(folder,'games.csv')
     
     # Create list of weeks to crawl
     weeks = list(range(1,16)) + ['Bowl']
@@ -150,32 +152,32 @@ if __name__ == '__main__':
     to_crawl = list(itertools.product(seasons,divisions,weeks))
     # Crawl each combination of parameters (one week), retrying up to
     # max_attempts times.
-    max_attempts = 3
-    waittime = 30
-    all_weeks_games = []
-    for s,d,w in to_crawl:
-        # Does this file exist?
-        filename = '{}-{}-{}.csv'.format(s,d,w)
-        filepath = os.path.join(weekfolder,filename)
-        if not os.path.isfile(filepath):
-            week_games = None
-            for attempt in range(max_attempts):
-                if attempt > 0:
-                    print('RETRY #{}: '.format(attempt),end='')
-                week_games = _get_week_games(s,d,w,waittime)
-                print("{} {} Week {} - {} games".format(s,d,w,len(week_games)))
-                if len(week_games) > 0:
-                    week_games.to_csv(filepath,index=False)
-                    break
+    with BatchWriter(allgames_file,_GAMES_COLUMNS) as writer:
+        for s,d,w in to_crawl:
+            # Does this file exist?
+            filename = '{}-{}-{}.csv'.format(s,d,w)
+            filepath = os.path.join(weekfolder,filename)
+            if not os.path.isfile(filepath):
+                for attempt in range(max_attempts):
+                    if attempt > 0:
+                        print('RETRY #{}: '.format(attempt),end='')
+                    # One page of games is small, so keep it to count it
+                    week_games = list(_get_week_games(s,d,w,waittime))
+                    print("{} {} Week {} - {} games".format(s,d,w,len(week_games)))
+                    if len(week_games) > 0:
+                        with BatchWriter(filepath,_GAMES_COLUMNS) as weekwriter:
+                            weekwriter.writerows(week_games)
+                        break
+                else:
+                    print("Failed. Moving on...")
+                    continue
             else:
-                print("Failed. Moving on...")
-        else:
-            print('{} exists'.format(filepath))
-            week_games = pandas.read_csv(filepath)
-        # Add this week's games to our list
-        if week_games is not None:
-            all_weeks_games.append(week_games)
+                print('{} exists'.format(filepath))
+            # Copy this week's games into the combined file
+            with open(filepath,newline='') as f:
+                writer.writerows(csv.DictReader(f))
+    return allgames_file
+
     
-    # Put all weeks games together into one DataFrame
-    all_games = pandas.concat(all_weeks_games)
-    all_games.to_csv(os.path.join(basefolder,'games.csv'),index=False)
\ No newline at end of file
+if __name__ == '__main__':
+    crawl()
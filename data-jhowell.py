@@ -1,18 +1,27 @@
-import requests
 import urllib
 import time
-import bs4
-import lxml
 import pandas
 import re
 import datetime
 import os
 
+from batchwriter import BatchWriter
+
+# Columns of the raw games CSV, in the order _parsetable produces them
+_RAW_COLUMNS = ['Season','Team','Conference','GameNum',
+                'MonthDay','MonthDay_verified','HomeAway','HomeAway_verified',
+                'Opponent','Opponent_verified','Result','Result_verified',
+                'TeamPts','TeamPts_verified','OppPts','OppPts_verified',
+                'Site','Site_verified','Notes','Notes_verified']
+
 def _pullandsave(url,savedir,throttle):
     """Fetches a webpage, saves the HTML under savedir (using the page's
     filename), and returns a BeautifulSoup object of the page."""
     # Note: this can't handle pages with no filename at the end 
     # (e.g. http://www.google.com/mail/) Fortunately this website doesn't have those.
+    # Crawling dependencies are imported here so clean_raw works without them
+    import requests
+    import bs4
     time.sleep(throttle)
     page = requests.get(url)
     urltail = urllib.parse.urlsplit(url).path[1:]
@@ -22,11 +31,12 @@ def _pullandsave(url,savedir,throttle):
         f.write(page.text)
     return bs4.BeautifulSoup(page.text,'lxml')
 
-def _crawl(waittime,savedir):
+def crawl(waittime,savedir):
     """Crawls Jim Howell's website and: 1) saves all the raw pages to an archive
     folder, 2) parses all the tables into a format that's usable by elo and
     saves that as a CSV. All saving is done uder the directory passed in as
-    saveto."""
+    saveto. Games are written out in batches as pages are parsed, so memory use
+    does not grow with the size of the site. Returns the path of the CSV."""
     # Make the directory into which we will save everything
     # Get the main page
     mainpage = 'http://www.jhowell.net/cf/scores/byName.htm'
@@ -36,27 +46,22 @@ def _crawl(waittime,savedir):
     _ = _pullandsave(notespage,savedir,waittime)
     # Follow all the links on the page, parsing each one
     links = soup.find_all('a')
-    gamedata = []
-    for link in links:
-        linkurl = urllib.parse.urljoin(mainpage,link.get('href'))
-        if linkurl[:7] != 'mailto:':
-            linksoup = _pullandsave(linkurl,savedir,waittime)
-            pagedata = _parsepage(linksoup)
-            gamedata += pagedata
-    rawgamedf = pandas.concat(gamedata)
-    rawgamedf = rawgamedf.reset_index()[rawgamedf.columns]
-    rawgamedf.to_csv(os.path.join(savedir,'rawgames.csv'),index=False)
-    return rawgamedf
+    rawgamesfile = os.path.join(savedir,'rawgames.csv')
+    with BatchWriter(rawgamesfile,_RAW_COLUMNS) as writer:
+        for link in links:
+            linkurl = urllib.parse.urljoin(mainpage,link.get('href'))
+            if linkurl[:7] != 'mailto:':
+                linksoup = _pullandsave(linkurl,savedir,waittime)
+                writer.writerows(_parsepage(linksoup))
+    return rawgamesfile
 
 def _parsepage(soup):
-    """Takes a page's soup and returns a list of pandas DataFrames of <table>s
-    in the page that contained game data."""
+    """Takes a page's soup and yields a dict for each game found in the
+    <table>s in the page."""
     # Find all tables and parse them for game info
     tables = soup.find_all('table')
-    pagedata = []
     for t in tables:
-        pagedata.append(_parsetable(t))
-    return pagedata
+        yield from _parsetable(t)
 
 def _colorverified(rgb):
     if rgb=='#00FF00':
@@ -69,19 +74,18 @@ def _colorverified(rgb):
         return ''
     
 def _parsetable(table):
-    """Parses a <table> element from a page's soup into a pandas DataFrame,
-    doing minimal processing (usually just .strip())"""
+    """Parses a <table> element from a page's soup, yielding a dict for each
+    game and doing minimal processing (usually just .strip())"""
     rows = table.find_all('tr')
     # Find the header text
     header = rows[0].text.strip()
     if header == 'Key':
-        return None
+        return
     parsed_header = re.search('(\d+)\s*-\s*(.*?)\s*\(([^()]+)\)$',header)
     season = int(parsed_header.group(1))
     team = parsed_header.group(2)
     conference = parsed_header.group(3)
     # Get data from each of the rows (except header and total)
-    gamelist = []
     gamenum = 0
     for r in rows[1:-1]:
         gamenum += 1
@@ -111,28 +115,29 @@ def _parsetable(table):
         else:
             info['Notes'] = ''
             info['Notes_verified'] = ''
-        gamelist.append(info)
-    return pandas.DataFrame(gamelist)
+        yield info
 
     
 def clean_raw(rawgames):
-    """Transforms a 'raw game' dataframe as returned by _crawl() and transforms
-    it into a standard format."""
-    # Process the header
-    def splitheader(h): return re.search('(\d+)\s*-\s*(.*?)\s*\(([^()]+)\)$',h)
-    parsed_header = rawgames['Header'].map(splitheader)
-    season = parsed_header.map(lambda x: int(x.group(1)))
-    team = parsed_header.map(lambda x: x.group(2))
-    conference = parsed_header.map(lambda x: x.group(3))
-    # Extract the opponent
-    def getopp(x): return re.sub('^[*+]|\s*\([^()]*\)$','',x)
-    opponent = rawgames['Opponent'].map(getopp)
+    """Transforms a 'raw game' dataframe, as saved by crawl(), into a standard
+    format. Each game is given a Week: weeks run Monday to Sunday, and week 1
+    of a season is the week of its first game."""
+    # The parser has already split the header and cleaned up the opponent
+    season = rawgames['Season']
+    team = rawgames['Team']
+    conference = rawgames['Conference']
+    opponent = rawgames['Opponent']
     # Date
     month = rawgames['MonthDay'].map(lambda x: int(x.split("/")[0]))
     day = rawgames['MonthDay'].map(lambda x: int(x.split("/")[1]))
     year = (month >= 8)*season + (month < 8)*(season + 1)
     dateparts = pandas.DataFrame({'month':month,'day':day,'year':year})
     gamedate = dateparts.apply(lambda r: datetime.date(r.year,r.month,r.day), axis=1)
+    # Week, counted from the Monday before each season's first game
+    stamps = pandas.to_datetime(dateparts)
+    mondays = stamps - pandas.to_timedelta(stamps.dt.weekday,unit='D')
+    firstmonday = mondays.groupby(season).transform('min')
+    week = (stamps - firstmonday).dt.days // 7 + 1
     # Location
     neutralsite = (rawgames['Site'].fillna('') != '')
     home = (rawgames['HomeAway'] == 'vs.')
@@ -143,16 +148,17 @@ def clean_raw(rawgames):
     lose = (rawgames['Result'] == 'L')
     # CONSTRUCT THE GAMES DF
     games = pandas.DataFrame(index=rawgames.index,
-                             columns=['Date','Season','Home','Away','Winner',
-                                      'HomePts','AwayPts','NeutralSite'])
+                             columns=['Date','Season','Week','Home','Away',
+                                      'Winner','HomePts','AwayPts','NeutralSite'])
     games['Season'] = season
+    games['Week'] = week
     games['Date'] = gamedate
     teamishome = ((~neutralsite)&home)|(neutralsite&(team<opponent))
-    games['Home'] = teamishome*team + (~teamishome)*opponent
-    games['Away'] = teamishome*opponent + (~teamishome)*team
-    games['HomePts'] = teamishome*teampoints + (~teamishome)*opppoints
-    games['AwayPts'] = teamishome*opppoints + (~teamishome)*teampoints
-    games['Winner'] = win*team + lose*opponent
+    games['Home'] = team.where(teamishome,opponent)
+    games['Away'] = opponent.where(teamishome,team)
+    games['HomePts'] = teampoints.where(teamishome,opppoints)
+    games['AwayPts'] = opppoints.where(teamishome,teampoints)
+    games['Winner'] = team.where(win,opponent.where(lose,''))
     games['NeutralSite'] = neutralsite
     games = games.drop_duplicates().reset_index()[games.columns]
     # CONSTRUCT TEAMS DF
@@ -165,8 +171,7 @@ if __name__=='__main__':
     # If run as a program, crawl the web for the latest data, parse, and save
     # as CSVs.
     ###
-    rawgames = _crawl(1,'Data/jhowell')
-    #rawgames = pandas.read_csv('Data/2018-01-03-150026/rawgames.csv')
-    #games,teams = clean_raw(rawgames)
-    #games.to_csv('Data/games.csv',index=False)
-    #teams.to_csv('Data/teams.csv',index=False)
\ No newline at end of file
+    rawgamesfile = crawl(1,'Data/jhowell')
+    games,teams = clean_raw(pandas.read_csv(rawgamesfile))
+    games.to_csv('Data/games.csv',index=False)
+    teams.to_csv('Data/teams.csv',index=False)
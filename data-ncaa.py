@@ -5,6 +5,16 @@ import re
 import urllib
 import pandas
 import time
+import itertools
+import os
+import csv
+
+from batchwriter import BatchWriter
+
+# Columns of each team's games CSV, and of the combined games CSV
+_TEAM_COLUMNS = ['Date','HomeAway','Site','Opponent','Result','TeamPts',
+                 'OppPts','Overtimes']
+_GAMES_COLUMNS = _TEAM_COLUMNS + ['Team','Season']
 
 def _delay_get(delay=1, *args, **kwargs):
     """Sleeps for delay seconds then calls requests.get"""
@@ -58,12 +68,9 @@ def _get_team_urls(season,division):
     #return teams, all_games.reset_index()[all_games.columns]
         
 def _get_team_games(url):
-    """Loads the page at url and returns a pandas DataFrame of games found there.
-    The dataframe will be missing some information - most notably, the name of
+    """Loads the page at url and yields a dict for each game found there.
+    The games will be missing some information - most notably, the name of
     the team whose page this is. That will be added on by the calling function."""
-    # What does an "empty" table look like?
-    emptydf = pandas.DataFrame({'Date':[],'HomeAway':[],'Site':[],'Opponent':[],
-                                'Result':[],'TeamPts':[],'OppPts':[],'Overtimes':[]})
     response = requests.get(url)
     page_text = response.text
     soup = bs4.BeautifulSoup(page_text,'lxml')
@@ -77,13 +84,12 @@ def _get_team_games(url):
             break
     else:
         # No games found on this page
-        return emptydf
+        return
     # Now search our table for games
     rows = games_table.find_all('tr')
     if len(rows) < 3:
         # No games found on this page
-        return emptydf
-    games = []
+        return
     for r in rows[2:]: #ignore headers
         data = {}
         cells = r.find_all('td')
@@ -120,21 +126,18 @@ def _get_team_games(url):
             data['TeamPts'] = int(scorematch.group(2))
             data['OppPts'] = int(scorematch.group(3))
             data['Overtimes'] = 0 if scorematch.group(4) is None else int(scorematch.group(4))
-        # Add this game to our list
-        games.append(data)
-    return pandas.DataFrame(games)
-
+        yield data
 
-
-if __name__=='__main__':
-    import itertools
-    import os
-    
+def crawl(folder='Data/NCAA',years=range(2017,2001,-1),
+          divisions=('FBS','FCS','D2','D3')):
+    """Crawls stats.ncaa.org for every team's games in the given years and
+    divisions, saving them under folder. Team pages and per-team game files
+    that already exist are not crawled again. Returns the path of the combined
+    games CSV."""
     # Get the team pages URLS if we don't already have it
-    teamurls_file = 'Data/NCAA/team_urls.csv'
+    os.makedirs(folder,exist_ok=True)
+    teamurls_file = os.path.join(folder,'team_urls.csv')
     if not os.path.isfile(teamurls_file):
-        years = range(2017,2001,-1)
-        divisions = ['FBS','FCS','D2','D3']
         to_crawl = list(itertools.product(years,divisions))
         all_teams_list = []
         for y,d in to_crawl:
@@ -148,30 +151,32 @@ if __name__=='__main__':
         print('\n{} already exists\n'.format(teamurls_file))
         
     # Get the games for each team and save them to individual team files
-    allgames_file = 'Data/NCAA/games.csv'
-    teamfiles_folder = 'Data/NCAA/TeamFiles/'
+    allgames_file = os.path.join(folder,'games.csv')
+    teamfiles_folder = os.path.join(folder,'TeamFiles')
     if not os.path.isfile(allgames_file):
         all_teams = pandas.read_csv(teamurls_file)
-        teamgames_list = []
-        for i in all_teams.index:
-            teamfile_name = '{}-{}-{}.csv'.format(all_teams.loc[i,'Team'],
-                    all_teams.loc[i,'Season'],all_teams.loc[i,'Division'])
-            teamfile = os.path.join(teamfiles_folder,teamfile_name)
-            if not os.path.isfile(teamfile):
-                print(all_teams.loc[i,'Team'], all_teams.loc[i,'Season'],
-                        all_teams.loc[i,'Division'], all_teams.loc[i,'URL'],
-                        end=' - ')
-                teamgames = _get_team_games(all_teams.loc[i,'URL'])
-                teamgames.to_csv(teamfile,index=False)
-                print('{} games'.format(len(teamgames)))
-            else:
-                teamgames = pandas.read_csv(teamfile)
-            # Add missing data elements
-            teamgames['Team'] = all_teams.loc[i,'Team']
-            teamgames['Season'] = all_teams.loc[i,'Season']
-            teamgames_list.append(teamgames)
-        all_games = pandas.concat(teamgames_list)
-        all_games.to_csv(allgames_file,index=False)
+        with BatchWriter(allgames_file,_GAMES_COLUMNS) as writer:
+            for i in all_teams.index:
+                teamfile_name = '{}-{}-{}.csv'.format(all_teams.loc[i,'Team'],
+                        all_teams.loc[i,'Season'],all_teams.loc[i,'Division'])
+                teamfile = os.path.join(teamfiles_folder,teamfile_name)
+                if not os.path.isfile(teamfile):
+                    print(all_teams.loc[i,'Team'], all_teams.loc[i,'Season'],
+                            all_teams.loc[i,'Division'], all_teams.loc[i,'URL'],
+                            end=' - ')
+                    with BatchWriter(teamfile,_TEAM_COLUMNS) as teamwriter:
+                        teamwriter.writerows(_get_team_games(all_teams.loc[i,'URL']))
+                    print('{} games'.format(teamwriter.rowcount))
+                # Add missing data elements and copy into the combined file
+                with open(teamfile,newline='') as f:
+                    for game in csv.DictReader(f):
+                        game['Team'] = all_teams.loc[i,'Team']
+                        game['Season'] = all_teams.loc[i,'Season']
+                        writer.writerow(game)
     else:
         print('\n{} already exists\n'.format(allgames_file))
-    
\ No newline at end of file
+    return allgames_file
+
+
+if __name__=='__main__':
+    crawl()
@@ -1,53 +1,134 @@
 # Library imports
 import pandas
+import numpy
+import scipy.sparse
+import scipy.sparse.linalg
 import datetime
-import re
 
 # File imports
 import elo
-import data
+import schedule
 
-# Constants
+# Default parameters
 K = 20 # 0 - 50
 MAJOR_ELO = 1500
 NONMAJOR_ELO = 1200 # 900 - 1500
 REGRESSION = 0.333 # 0.0 - 0.5
 HOMEFIELD = 25 # 0 - 50
 
-# Read the data
-games = data.get_games()
-games = games[games['Season']>=1977]
-teams = data.get_teams()
+def _solve_week(elos, delta, incidence, incidence_t, result, homeadv, k, tol,
+                maxiter, identity):
+    """Solves for the week's rating changes delta that agree with the
+    post-week ratings, i.e. delta = incidence_t @ elodelta(post-week diffs),
+    by Newton's method starting from delta. Each step is halved until it
+    shrinks the residual, so that large k doesn't overshoot. Returns the
+    solved delta, or None if it doesn't converge within maxiter steps. Also
+    returns None as soon as 30 halvings of a step fail to shrink the
+    residual, since the method has stalled."""
+    def residual(delta):
+        diff = incidence @ (elos + delta) + homeadv
+        return delta - incidence_t @ elo.elodelta(diff,0,result,k), diff
+    res,diff = residual(delta)
+    for _ in range(maxiter):
+        # The Jacobian is I + incidence_t @ D @ incidence, where D holds each
+        # game's k * d(winprob)/d(diff)
+        p = elo.winprob(diff,0)
+        slope = scipy.sparse.diags(k*numpy.log(10)/400*p*(1-p))
+        jacobian = identity + incidence_t @ slope @ incidence
+        step = scipy.sparse.linalg.spsolve(jacobian.tocsc(),res)
+        if numpy.abs(step).max() <= tol:
+            return delta - step
+        size = numpy.abs(res).max()
+        for _ in range(30):
+            newres,newdiff = residual(delta - step)
+            if numpy.abs(newres).max() < size:
+                break
+            step = step/2
+        else:
+            return None
+        delta,res,diff = delta - step,newres,newdiff
+    return None
 
-# Do ELO
-print(datetime.datetime.now())
-all_teams = set(games['Home'])|set(games['Away'])
-elos = pandas.Series(NONMAJOR_ELO,index=all_teams)
-games['Result'] = (games['Home'] == games['Winner']) + 0.5*games['Winner'].isna()
-seasons = games.groupby('Season')
-season_indexes = sorted(seasons.groups.keys())
-for s in season_indexes:
-    print(s, datetime.datetime.now())
-    seasongames = seasons.get_group(s)
-    majorteams = set(teams[teams['Season']==s]['Team'])
-    # Regress everyone to their group mean
-    ismajor = pandas.Series(elos.index.isin(majorteams),index=elos.index)
-    averages = ismajor*MAJOR_ELO + (~ismajor)*NONMAJOR_ELO
-    elos += REGRESSION*averages - REGRESSION*elos
-    elos.name = 'Elo'
-    # Run this season's games
-    weeks = seasongames.groupby('Week')
-    week_indexes = sorted(weeks.groups.keys())
-    for w in week_indexes:
-        weekgames = weeks.get_group(w)
-        data = weekgames.join(elos,how='left',on='Home')\
-                .join(elos,how='left',on='Away',lsuffix='_home',rsuffix='_away')
-        gamedeltas = elo.elodelta(data['Elo_home'],data['Elo_away'],data['Result'],K)
-        gamedeltas.name = 'Delta'
-        data = data.join(gamedeltas)
-        homedelta = data.groupby('Home')['Delta'].sum()
-        awaydelta = -data.groupby('Away')['Delta'].sum()
-        delta = homedelta.add(awaydelta,fill_value=0)
-        elos = elos.add(delta,fill_value=0)
-        elos.name = 'Elo'
-print(datetime.datetime.now())
+def run(weekly, k=K, major_elo=MAJOR_ELO, nonmajor_elo=NONMAJOR_ELO,
+        regression=REGRESSION, homefield=0, solve=False, tol=1e-6,
+        maxiter=100, history=False, verbose=False):
+    """Runs Elo over a schedule.WeeklyIncidence one season and one week at a
+    time. All games in a week are updated simultaneously. Returns a tuple
+    (elos, loglik): a pandas Series of every team's final Elo, and the
+    log-likelihood of all the game results under the ratings going into each
+    week. If history is true, a third element is returned: a pandas DataFrame
+    with columns Season, Week, Team and Elo giving the Elo of each team going
+    into each week it played.
+
+    weekly - a schedule.WeeklyIncidence of the games to rate.
+    k - the rating change constant to use.
+    major_elo - the mean that major teams are regressed towards each season.
+    nonmajor_elo - the mean that other teams are regressed towards each season,
+        and the starting Elo of every team.
+    regression - fraction of the way each team is regressed to its mean
+        before each season.
+    homefield - Elo bonus for the home team in games not at a neutral site.
+        The default of 0 leaves home field out, as the original ratings did;
+        HOMEFIELD is a reasonable value to start tuning from.
+    solve - if true, each week's updates are computed from the week's
+        post-update ratings instead of its pre-update ratings, by solving for
+        them with Newton's method. Raises ValueError if a week doesn't
+        converge.
+    tol - largest Newton step in any Elo at which solve considers a week
+        converged.
+    maxiter - number of Newton steps solve tries per week.
+    history - whether to also return each team's week-by-week Elo.
+    verbose - whether to print progress.
+    """
+    if verbose:
+        print(datetime.datetime.now())
+    nteams = len(weekly.teams)
+    elos = numpy.full(nteams,float(nonmajor_elo))
+    identity = scipy.sparse.identity(nteams,format='csr')
+    loglik = 0.0
+    weekhistories = []
+    for s,ismajor,weeks in weekly.seasons:
+        if verbose:
+            print(s, datetime.datetime.now())
+        # Regress everyone to their group mean
+        averages = ismajor*major_elo + (~ismajor)*nonmajor_elo
+        elos += regression*averages - regression*elos
+        # Run this season's games
+        for w,incidence,incidence_t,result,athome,playing in weeks:
+            if history:
+                weekhistories.append(pandas.DataFrame({'Season':s,'Week':w,
+                        'Team':weekly.teams[playing],'Elo':elos[playing]}))
+            # Home-minus-away Elo of every game, including home field
+            diff = incidence @ elos + homefield*athome
+            winprob = elo.winprob(diff,0)
+            loglik += (result*numpy.log(winprob) + (1-result)*numpy.log(1-winprob)).sum()
+            delta = incidence_t @ elo.elodelta(diff,0,result,k)
+            if solve:
+                delta = _solve_week(elos,delta,incidence,incidence_t,result,
+                                    homefield*athome,k,tol,maxiter,identity)
+                if delta is None:
+                    raise ValueError('Season {} week {} did not converge'.format(s,w))
+            elos += delta
+    if verbose:
+        print(datetime.datetime.now())
+    elos = pandas.Series(elos,index=weekly.teams,name='Elo')
+    if history:
+        if len(weekhistories) > 0:
+            elohistory = pandas.concat(weekhistories,ignore_index=True)
+        else:
+            elohistory = pandas.DataFrame(columns=['Season','Week','Team','Elo'])
+        return elos, loglik, elohistory
+    return elos, loglik
+
+def rate(games, teams, **kwargs):
+    """Builds a schedule.WeeklyIncidence from games and teams and runs Elo over
+    it. Takes the same keyword arguments, and returns the same results, as
+    run(). To rate the same games more than once, build the WeeklyIncidence
+    once and use run() instead."""
+    return run(schedule.WeeklyIncidence(games, teams), **kwargs)
+
+if __name__=='__main__':
+    # Rating is run from the command line interface
+    import sys
+    import cfbelo
+    cfbelo.run(['rate'] + sys.argv[1:])
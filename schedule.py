@@ -0,0 +1,186 @@
+"""Prebuilt indexes of the schedule: who each team played, for schedule-based
+statistics, and each week's games as a matrix, for rating"""
+import numpy
+import pandas
+import scipy.sparse
+
+def _code_teams(games):
+    """Returns a tuple (teams, home, away): a sorted pandas Index of every team
+    in games, and the codes (positions in teams) of each game's home and away
+    teams."""
+    teams = pandas.Index(sorted(set(games['Home'])|set(games['Away'])))
+    return teams, teams.get_indexer(games['Home']), teams.get_indexer(games['Away'])
+
+def _split_weeks(games):
+    """Returns a list of (season, week, rows) for every week in games, in the
+    order played, where rows are the row positions of the week's games."""
+    season = games['Season'].to_numpy()
+    week = games['Week'].to_numpy()
+    order = numpy.lexsort((week,season))
+    season, week = season[order], week[order]
+    changed = (season[1:] != season[:-1]) | (week[1:] != week[:-1])
+    bounds = numpy.concatenate([[0],numpy.flatnonzero(changed)+1,[len(order)]])
+    return [(season[start],week[start],order[start:end])
+            for start,end in zip(bounds[:-1],bounds[1:]) if end > start]
+
+class ScheduleIndex:
+    """Compressed sparse row (CSR) index of the games each team played.
+
+    Every game appears twice, once from each team's side. The entries for the
+    team with code t are at positions indptr[t]:indptr[t+1] of the entry
+    arrays, sorted by season and week. The entry arrays are:
+
+    game - row position of the game in the games DataFrame (for .iloc).
+    opponent - code of the opponent.
+    season, week - when the game was played.
+    ishome - whether the team was the home team.
+
+    Team codes index into teams, a pandas Index of team names.
+
+    games - a pandas DataFrame with columns Season, Week, Home and Away.
+    """
+    def __init__(self, games):
+        n = len(games)
+        self.teams, home, away = _code_teams(games)
+        # Number each (season, week) in the order played
+        weeks = _split_weeks(games)
+        gameperiod = numpy.zeros(n,dtype=int)
+        for i,(s,w,rows) in enumerate(weeks):
+            gameperiod[rows] = i
+        self._periods = pandas.MultiIndex.from_arrays(
+                [[s for s,w,rows in weeks],[w for s,w,rows in weeks]])
+        team = numpy.concatenate([home,away])
+        opponent = numpy.concatenate([away,home])
+        game = numpy.tile(numpy.arange(n),2)
+        ishome = numpy.repeat([True,False],n)
+        period = numpy.tile(gameperiod,2)
+        # Sort entries by team, then by when they were played
+        order = numpy.lexsort((period,team))
+        self.game = game[order]
+        self.opponent = opponent[order]
+        self.season = numpy.tile(games['Season'].to_numpy(),2)[order]
+        self.week = numpy.tile(games['Week'].to_numpy(),2)[order]
+        self.ishome = ishome[order]
+        self._team = team[order]
+        self._periodcode = period[order]
+        counts = numpy.bincount(team,minlength=len(self.teams))
+        self.indptr = numpy.concatenate([[0],numpy.cumsum(counts)])
+        # Code of each entry's season, for grouping
+        self._seasoncode, self._seasons = pandas.factorize(self.season,sort=True)
+
+    def _slice(self, team):
+        """Returns the slice of the entry arrays belonging to team."""
+        t = self.teams.get_loc(team)
+        return slice(self.indptr[t],self.indptr[t+1])
+
+    def games(self, team):
+        """Returns the row positions of team's games, in order played."""
+        return self.game[self._slice(team)]
+
+    def opponents(self, team):
+        """Returns the names of team's opponents, in order played."""
+        return self.teams[self.opponent[self._slice(team)]]
+
+    def common_opponents(self, team1, team2):
+        """Returns the names of all teams that both team1 and team2 played."""
+        common = numpy.intersect1d(self.opponent[self._slice(team1)],
+                                   self.opponent[self._slice(team2)])
+        return self.teams[common]
+
+    def opponent_ratings(self, history):
+        """Returns an array with, for every entry, the opponent's Elo going into
+        that game. Entries whose opponent is missing from history are NaN.
+
+        history - a pandas DataFrame with columns Season, Week, Team and Elo,
+            as returned by main.rate(..., history=True).
+        """
+        nteams = len(self.teams)
+        period = self._periods.get_indexer(
+                pandas.MultiIndex.from_arrays([history['Season'],history['Week']]))
+        team = self.teams.get_indexer(history['Team'])
+        known = (period >= 0) & (team >= 0)
+        # Dense (period, team) table of ratings to look opponents up in
+        table = numpy.full(len(self._periods)*nteams,numpy.nan)
+        table[period[known]*nteams + team[known]] = history['Elo'].to_numpy()[known]
+        return table[self._periodcode*nteams + self.opponent]
+
+    def _team_season_mean(self, values):
+        """Averages values (one per entry) over each team's games in each
+        season, ignoring NaNs. Returns a pandas DataFrame with columns Team,
+        Season, Games and the mean as Value."""
+        nseasons = len(self._seasons)
+        known = ~numpy.isnan(values)
+        group = self._team*nseasons + self._seasoncode
+        size = len(self.teams)*nseasons
+        games = numpy.bincount(group[known],minlength=size)
+        totals = numpy.bincount(group[known],weights=values[known],minlength=size)
+        played = numpy.flatnonzero(games)
+        return pandas.DataFrame({'Team':self.teams[played // nseasons],
+                                 'Season':self._seasons[played % nseasons],
+                                 'Games':games[played],
+                                 'Value':totals[played]/games[played]})
+
+    def strength_of_schedule(self, history):
+        """Returns every team's strength of schedule in every season: the mean
+        Elo of its opponents going into each game. Returns a pandas DataFrame
+        with columns Team, Season, Games and SOS.
+
+        history - a pandas DataFrame with columns Season, Week, Team and Elo,
+            as returned by main.rate(..., history=True).
+        """
+        sos = self._team_season_mean(self.opponent_ratings(history))
+        return sos.rename(columns={'Value':'SOS'})
+
+    def opponent_average(self, elos):
+        """Returns the mean of every team's opponents' ratings in every season,
+        using one rating per opponent (e.g. the final ratings from main.rate).
+        Returns a pandas DataFrame with columns Team, Season, Games and OppElo.
+
+        elos - a dict-like of team ratings, such as a pandas Series.
+        """
+        ratings = pandas.Series(elos).reindex(self.teams).to_numpy(dtype=float)
+        average = self._team_season_mean(ratings[self.opponent])
+        return average.rename(columns={'Value':'OppElo'})
+
+class WeeklyIncidence:
+    """Each week's games as a sparse signed incidence matrix (games x teams),
+    with +1 in the home team's column and -1 in the away team's. For a vector
+    of Elos indexed by team code, incidence @ elos is each game's
+    home-minus-away Elo, and incidence.T @ deltas sums each team's rating
+    changes over the week. Building this is the slow part of rating, so build
+    it once and pass it to main.run() for every set of parameters tried.
+
+    seasons is a list of tuples (season, ismajor, weeks), in order played, where
+    ismajor is a boolean array over teams and weeks is a list of tuples
+    (week, incidence, transposed incidence, result, athome, playing). result is
+    each game's outcome for the home team, athome is 0 for neutral site games
+    and 1 otherwise, and playing is the codes of the teams with games that
+    week.
+
+    games - a pandas DataFrame with columns Season, Week, Home, Away and Winner,
+        and optionally NeutralSite. A missing Winner is a tie.
+    teams - a pandas DataFrame with columns Team and Season listing the major
+        teams in each season.
+    """
+    def __init__(self, games, teams):
+        self.teams, home, away = _code_teams(games)
+        nteams = len(self.teams)
+        result = ((games['Home'] == games['Winner']) + 0.5*games['Winner'].isna()).to_numpy(dtype=float)
+        if 'NeutralSite' in games:
+            athome = (~games['NeutralSite'].astype(bool)).to_numpy(dtype=float)
+        else:
+            athome = numpy.ones(len(games))
+        self.seasons = []
+        for s,w,rows in _split_weeks(games):
+            if len(self.seasons) == 0 or self.seasons[-1][0] != s:
+                majorteams = teams[teams['Season']==s]['Team']
+                self.seasons.append((s,self.teams.isin(majorteams),[]))
+            n = len(rows)
+            incidence = scipy.sparse.csr_matrix(
+                    (numpy.repeat([1.0,-1.0],n),
+                     (numpy.tile(numpy.arange(n),2),
+                      numpy.concatenate([home[rows],away[rows]]))),
+                    shape=(n,nteams))
+            playing = numpy.unique(numpy.concatenate([home[rows],away[rows]]))
+            self.seasons[-1][2].append((w,incidence,incidence.T.tocsr(),
+                                        result[rows],athome[rows],playing))
@@ -0,0 +1,99 @@
+"""Checks main.run against a straightforward groupby version of the weekly
+Elo updates, on randomly generated games. Run with pytest, or as a script."""
+import numpy
+import pandas
+
+import elo
+import main
+import schedule
+
+def _random_games(seasons=range(2000,2010), nteams=120, nweeks=12, seed=0):
+    """Returns (games, teams) DataFrames of random round-robin-ish games."""
+    rng = numpy.random.default_rng(seed)
+    names = ['Team {}'.format(i) for i in range(nteams)]
+    rows = []
+    for s in seasons:
+        for w in range(1,nweeks+1):
+            for h,a in rng.permutation(nteams).reshape(-1,2):
+                hp,ap = rng.integers(0,50,2)
+                winner = names[h] if hp > ap else (names[a] if ap > hp else None)
+                rows.append((s,w,names[h],names[a],winner,rng.random() < 0.1))
+    games = pandas.DataFrame(rows,columns=['Season','Week','Home','Away',
+                                           'Winner','NeutralSite'])
+    teams = pandas.DataFrame([(t,s) for s in seasons for t in names[:nteams//3]],
+                             columns=['Team','Season'])
+    return games, teams
+
+def _groupby_rate(games, teams, k, major_elo, nonmajor_elo, regression,
+                  homefield):
+    """The weekly updates written with pandas joins and groupbys. Returns the
+    same (elos, loglik, history) as main.run(..., history=True)."""
+    all_teams = set(games['Home'])|set(games['Away'])
+    elos = pandas.Series(float(nonmajor_elo),index=sorted(all_teams),name='Elo')
+    games = games.assign(Result=(games['Home'] == games['Winner']) + 0.5*games['Winner'].isna(),
+                         Homefield=homefield*(~games['NeutralSite']))
+    loglik = 0.0
+    histories = []
+    for s,seasongames in games.groupby('Season'):
+        majorteams = set(teams[teams['Season']==s]['Team'])
+        ismajor = pandas.Series(elos.index.isin(majorteams),index=elos.index)
+        averages = ismajor*major_elo + (~ismajor)*nonmajor_elo
+        elos += regression*averages - regression*elos
+        for w,weekgames in seasongames.groupby('Week'):
+            playing = sorted(set(weekgames['Home'])|set(weekgames['Away']))
+            histories.append(pandas.DataFrame({'Season':s,'Week':w,'Team':playing,
+                                               'Elo':elos[playing].to_numpy()}))
+            data = weekgames.join(elos,how='left',on='Home')\
+                    .join(elos,how='left',on='Away',lsuffix='_home',rsuffix='_away')
+            homeelo = data['Elo_home'] + data['Homefield']
+            p = elo.winprob(homeelo,data['Elo_away'])
+            loglik += (data['Result']*numpy.log(p) + (1-data['Result'])*numpy.log(1-p)).sum()
+            data['Delta'] = elo.elodelta(homeelo,data['Elo_away'],data['Result'],k)
+            homedelta = data.groupby('Home')['Delta'].sum()
+            awaydelta = -data.groupby('Away')['Delta'].sum()
+            elos = elos.add(homedelta.add(awaydelta,fill_value=0),fill_value=0)
+            elos.name = 'Elo'
+    return elos, loglik, pandas.concat(histories,ignore_index=True)
+
+def test_run_matches_groupby():
+    games,teams = _random_games()
+    weekly = schedule.WeeklyIncidence(games, teams)
+    for homefield in [0, 25]:
+        params = dict(k=20, major_elo=1500, nonmajor_elo=1200, regression=0.333,
+                      homefield=homefield)
+        elos,loglik,history = main.run(weekly, history=True, **params)
+        refelos,refloglik,refhistory = _groupby_rate(games, teams, **params)
+        assert numpy.allclose(elos.sort_index(), refelos.sort_index())
+        assert numpy.isclose(loglik, refloglik)
+        history = history.sort_values(['Season','Week','Team'],ignore_index=True)
+        refhistory = refhistory.sort_values(['Season','Week','Team'],ignore_index=True)
+        assert (history[['Season','Week','Team']] == refhistory[['Season','Week','Team']]).all().all()
+        assert numpy.allclose(history['Elo'], refhistory['Elo'])
+
+def test_solve_is_consistent():
+    # After each solved week, every team's change should equal the simple
+    # update computed from the post-week ratings, even with a large k.
+    games,teams = _random_games(seasons=[2000], nweeks=3)
+    weekly = schedule.WeeklyIncidence(games, teams)
+    for k in [20, 400, 5000]:
+        _,_,history = main.run(weekly, k=k, regression=0, solve=True,
+                               history=True)
+        elos,_ = main.run(weekly, k=k, regression=0, solve=True)
+        weeks = weekly.seasons[0][2]
+        for i,(w,incidence,incidence_t,result,athome,playing) in enumerate(weeks):
+            if i + 1 < len(weeks):
+                after = history[history['Week']==weeks[i+1][0]].set_index('Team')['Elo']
+            else:
+                after = elos
+            before = history[history['Week']==w].set_index('Team')['Elo']
+            post = after.reindex(weekly.teams).to_numpy()
+            pre = before.reindex(weekly.teams).to_numpy(copy=True)
+            # Teams not playing this week keep their rating
+            pre[numpy.isnan(pre)] = post[numpy.isnan(pre)]
+            update = incidence_t @ elo.elodelta(incidence @ post,0,result,k)
+            assert numpy.allclose(post - pre, update, atol=1e-4)
+
+if __name__ == '__main__':
+    test_run_matches_groupby()
+    test_solve_is_consistent()
+    print('ok')
@@ -0,0 +1,63 @@
+"""Checks schedule.ScheduleIndex against plain loops over the game rows, on
+randomly generated games. Run with pytest, or as a script."""
+import numpy
+
+import main
+import schedule
+from test_main import _random_games
+
+def _shuffled_games():
+    """Returns (games, teams) with the games in random order, so the index has
+    to sort them into weeks itself."""
+    games,teams = _random_games(seasons=range(2000,2004))
+    games = games.sample(frac=1,random_state=1).reset_index(drop=True)
+    return games, teams
+
+def test_games_and_opponents():
+    games,teams = _shuffled_games()
+    index = schedule.ScheduleIndex(games)
+    for team in ['Team 0','Team 17','Team 119']:
+        rows = index.games(team)
+        played = games.iloc[rows]
+        # Exactly the team's games, in the order played
+        assert set(rows) == set(numpy.flatnonzero((games['Home']==team)|(games['Away']==team)))
+        order = list(zip(played['Season'],played['Week']))
+        assert order == sorted(order)
+        opponents = [a if h == team else h for h,a in zip(played['Home'],played['Away'])]
+        assert list(index.opponents(team)) == opponents
+
+def test_common_opponents():
+    games,teams = _shuffled_games()
+    index = schedule.ScheduleIndex(games)
+    def opponents(team):
+        return set(games[games['Home']==team]['Away'])|set(games[games['Away']==team]['Home'])
+    for team1,team2 in [('Team 0','Team 1'),('Team 5','Team 99'),('Team 42','Team 43')]:
+        expected = opponents(team1) & opponents(team2)
+        assert set(index.common_opponents(team1,team2)) == expected
+
+def test_strength_of_schedule():
+    games,teams = _shuffled_games()
+    elos,_,history = main.rate(games, teams, history=True)
+    index = schedule.ScheduleIndex(games)
+    sos = index.strength_of_schedule(history).set_index(['Team','Season'])
+    average = index.opponent_average(elos).set_index(['Team','Season'])
+    # Each opponent's Elo going into the game, and its final Elo
+    preweek = {(s,w,t):e for s,w,t,e in zip(history['Season'],history['Week'],
+                                            history['Team'],history['Elo'])}
+    pregame = {}
+    final = {}
+    for s,w,home,away in zip(games['Season'],games['Week'],games['Home'],games['Away']):
+        for team,opponent in [(home,away),(away,home)]:
+            pregame.setdefault((team,s),[]).append(preweek[(s,w,opponent)])
+            final.setdefault((team,s),[]).append(elos[opponent])
+    assert len(sos) == len(pregame)
+    for key,ratings in pregame.items():
+        assert sos.loc[key,'Games'] == len(ratings)
+        assert numpy.isclose(sos.loc[key,'SOS'], numpy.mean(ratings))
+        assert numpy.isclose(average.loc[key,'OppElo'], numpy.mean(final[key]))
+
+if __name__ == '__main__':
+    test_games_and_opponents()
+    test_common_opponents()
+    test_strength_of_schedule()
+    print('ok')